@@ -1,9 +1,17 @@
 # Save and load settings for this project to config.yml
 
+import hashlib
+import json
 import sys
+import time
 from pathlib import Path
 
-from ruamel.yaml import YAML
+import yaml
+
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:  # LibYAML bindings not available
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
 
 import helpers
 
@@ -18,17 +26,145 @@ class FbrefConfig:
         """
         default_file = Path.cwd() / "config.yml"
         self.path = override if override else default_file
+        # JSON copy of the parsed YAML, much faster to load on later runs
+        self.cache = self.path.with_suffix(self.path.suffix + ".json")
+        # Results of the last page scan, reused if the same URLs are rescanned
+        self.scan_cache = self.path.with_suffix(self.path.suffix + ".scan.json")
 
-        self.yaml = YAML()
         try:
-            self.config = self.yaml.load(self.path)
+            if (
+                self.cache.exists()
+                and self.cache.stat().st_mtime >= self.path.stat().st_mtime
+            ):
+                self.config = json.loads(self.cache.read_bytes())
+            else:
+                with self.path.open("rb") as f:
+                    self.config = yaml.load(f, Loader=_Loader)
+                self._write_cache()
         except FileNotFoundError:
             print("Settings file not found.")
             self.config = {}  # Initialize empty dict
 
+        # Variables are held as ordered sets (dict keys) in memory, lists on disk
+        if "variables" in self.config:
+            self.config["variables"] = {
+                cat: dict.fromkeys(vars)
+                for cat, vars in self.config["variables"].items()
+            }
+
+        # Results from the last scan, reused between update steps
+        self._scan_key = None
+        self._scan_result = None
+
+    def _serializable(self) -> dict:
+        """Returns settings with variable sets converted to lists"""
+        config = dict(self.config)
+        if "variables" in config:
+            config["variables"] = {
+                cat: list(vars) for cat, vars in config["variables"].items()
+            }
+        return config
+
+    def _write_cache(self) -> None:
+        """Writes parsed settings to the JSON cache file, if possible"""
+        try:
+            self.cache.write_text(json.dumps(self._serializable()))
+        except OSError:
+            pass  # e.g. read-only checkout, the YAML file is used instead
+
+    def _scan(self, urls: list) -> tuple:
+        """Finds the stats tables and their variables at the given URLs. Pages
+        are only fetched if these URLs have not been scanned in the last
+        helpers.CACHE_EXPIRE_SECS, otherwise the saved results of the last scan
+        are reused.
+
+        Args:
+            urls (list): List of FBref match URLs
+
+        Returns:
+            tuple of (table_types (set), variables (dict)): Table types found
+            and {table type: variables} as returned by get_all_variables()
+        """
+        key = hashlib.blake2b(
+            "\n".join(sorted(helpers.unique_urls(urls))).encode(), digest_size=16
+        ).hexdigest()
+        if key == self._scan_key:
+            return self._scan_result
+
+        try:
+            saved = json.loads(self.scan_cache.read_bytes())
+        except (OSError, ValueError):
+            saved = {}  # No usable saved scan
+
+        if (
+            saved.get("urls_hash") == key
+            and time.time() - saved.get("scanned_at", 0) < helpers.CACHE_EXPIRE_SECS
+        ):
+            table_types = set(saved["table_types"])
+            variables = saved["variables"]
+        else:
+            tables = helpers.get_table_types(helpers.fetch_pages(urls))
+            if not tables:
+                raise Exception("No valid stats tables found.")
+            table_types = set(tables.values())
+            variables = helpers.get_all_variables(tables)
+            try:
+                self.scan_cache.write_text(
+                    json.dumps(
+                        {
+                            "urls_hash": key,
+                            "scanned_at": time.time(),
+                            "table_types": sorted(table_types),
+                            "variables": variables,
+                        }
+                    )
+                )
+            except OSError:
+                pass  # e.g. read-only checkout, pages are fetched next time
+
+        self._scan_key = key
+        self._scan_result = (table_types, variables)
+        return self._scan_result
+
+    def clear_scan(self) -> None:
+        """Discards saved scan results so pages are fetched on the next scan"""
+        self._scan_key = None
+        self._scan_result = None
+        try:
+            self.scan_cache.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _priority_order(self) -> list:
+        """Returns the table priority order stored at the last save, if it is
+        still consistent with the table ranks (e.g. after manual edits).
+
+        Returns:
+            list: Table labels in order low priority -> high priority, or None
+        """
+        order = self.config.get("tables_priority_order")
+        ranks = self.config.get("tables", {})
+        if not order or set(order) != set(ranks) or len(order) != len(ranks):
+            return None
+        if any(ranks[a] < ranks[b] for a, b in zip(order, order[1:])):
+            return None
+        return order
+
     def save(self) -> None:
         """Saves settings to file"""
-        self.yaml.dump(self.config, self.path)
+        if "tables" in self.config:
+            self.config["tables_priority_order"] = helpers.priority_order(
+                self.config["tables"]
+            )
+        with self.path.open("wb") as f:
+            yaml.dump(
+                self._serializable(),
+                f,
+                Dumper=_Dumper,
+                sort_keys=False,
+                encoding="utf-8",
+            )
+        self._write_cache()
 
     def update_tables(self, urls: list) -> set:
         """Checks table types at given FBref match URLs and matches with
@@ -45,8 +181,7 @@ class FbrefConfig:
         except KeyError:
             setting_priorities = dict()  # Initialize empty dict
 
-        tables = helpers.get_table_types(urls)
-        table_types = set(tables.values())
+        table_types, _ = self._scan(urls)
 
         if setting_priorities:
             # Check if table types match
@@ -88,9 +223,11 @@ class FbrefConfig:
             existing_map = dict()  # Empty dict
 
         # Get variables from page(s)
-        all_vars = helpers.get_all_variables(urls)
+        _, all_vars = self._scan(urls)
         new_map = helpers.remove_duplicate_values(
-            variables=all_vars, ranks=self.config["tables"]
+            variables=all_vars,
+            ranks=self.config["tables"],
+            priorities=self._priority_order(),
         )
 
         added = helpers.find_difference(new_map, existing_map)
@@ -114,6 +251,10 @@ if __name__ == "__main__":
     else:
         config = FbrefConfig()  # Default "config.yml" used
 
+    # Run with --rescan to fetch pages even if they were scanned recently
+    if "--rescan" in sys.argv[1:]:
+        config.clear_scan()
+
     # Get URLs to build list of tables and variables
     print(
         "Provide FBRef match URL to scan for available variables."
@@ -123,6 +264,7 @@ if __name__ == "__main__":
     )
     urls = input("Reference URL(s): ")
     urls = list(map(str.strip, urls.split(",")))
+    urls = helpers.unique_urls(urls)
 
     # Check types of stats tables
     changes = config.update_tables(urls)
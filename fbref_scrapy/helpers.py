@@ -3,58 +3,176 @@ Contains helper functions to set up the scraper or change configuration.
 """
 
 import copy
+import io
+import re
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import requests
-from scrapy.http import TextResponse
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from parsel import Selector
+
+# Queries shared by every scanned page. The team and squad queries match
+# TEAMS_XPATH and SQUAD_ID_RE in items.py, used by MatchSpider
+_TEAMS_XP = '//div[@itemprop="performer"]//a/@href'
+_VARS_XP = "./thead/tr[last()]/th/@data-stat"
+_SQUAD_RE = re.compile(r"(?<=\/squads\/)[a-zA-Z0-9]+")
+
+# Maximum number of pages downloaded from FBref at the same time
+_MAX_WORKERS = 2
+
+# Seconds before saved pages and scan results are fetched again
+CACHE_EXPIRE_SECS = 3600
+
+try:
+    import requests_cache
+except ImportError:  # Caching is optional
+    requests_cache = None
+
+# Shared session so connections are kept alive and reused between requests.
+# If available, responses are cached in the project root and revalidated
+# using ETag/Last-Modified headers.
+if requests_cache:
+    _SESSION = requests_cache.CachedSession(
+        str(Path(__file__).resolve().parent.parent / ".fbref_http_cache"),
+        backend="sqlite",
+        cache_control=True,
+        expire_after=CACHE_EXPIRE_SECS,
+    )
+else:
+    _SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=_MAX_WORKERS))
+_SESSION.mount("http://", HTTPAdapter(pool_maxsize=_MAX_WORKERS))
 
 
-def select_top_priority(items: dict, priority: list) -> list:
-    """Recursively remove items from a list based on the passed priority order,
-    until only a single item remains in the list.
+def select_top_priority(items: list, priority: list):
+    """Remove items from a list based on the passed priority order, until only
+    a single item remains in the list.
 
     Args:
         items (list): List of values to narrow down to single value
         priority (list): List of values in order low priority -> high priority
 
     Returns:
-        [list]: List containing a single item
+        The single remaining item
     """
+    remaining = set(items)
+    if len(remaining) == 1:
+        return items[0]  # Return single item
 
-    # Create copies of mutable list arguments
-    items_copy = list(items[:])
-    priority_copy = list(priority[:])
+    for p in priority:
+        if p in remaining:
+            # Low priority item found, remove until only one is left
+            remaining.discard(p)
+            if len(remaining) == 1:
+                return remaining.pop()
 
-    if len(items_copy) == 1:
-        return items_copy[0]  # Return single item
 
-    for p in priority_copy:
-        if p in items_copy:
-            # If low priority item found, remove and recursively repeat
-            items_copy.remove(p)
-            priority_copy.remove(p)
-            return select_top_priority(items_copy, priority_copy)
+def unique_urls(urls: list) -> list:
+    """Normalizes URLs and removes blanks and duplicates, keeping the order in
+    which they were first given. Trailing slashes and utm_* tracking
+    parameters are dropped.
 
+    Args:
+        urls (list): List of URLs
 
-def get_table_types(urls: list) -> dict:
-    """Gets a list of tables with their types from FBref page.
+    Returns:
+        list: List of unique, normalized URLs
+    """
+    normalized = []
+    for url in urls:
+        if not url:
+            continue
+        parts = urlsplit(url)
+        query = parts.query
+        params = parse_qsl(query, keep_blank_values=True)
+        kept = [(k, v) for k, v in params if not k.startswith("utm_")]
+        if len(kept) != len(params):
+            query = urlencode(kept)  # Only re-encode if tracking was removed
+        normalized.append(
+            urlunsplit(parts._replace(path=parts.path.rstrip("/"), query=query))
+        )
+    return list(dict.fromkeys(normalized))
+
+
+def _inside_performer(el) -> bool:
+    """Checks whether an element is within a team (performer) div"""
+    return any(a.get("itemprop") == "performer" for a in el.iterancestors("div"))
+
+
+@lru_cache(maxsize=64)
+def _fetch_page(url: str) -> tuple:
+    """Downloads a single page and stream-parses only the parts needed: team
+    IDs and stats tables. The rest of the document is freed as parsing goes,
+    and only the extracted values are memoized, so each URL is fetched and
+    parsed once per session.
+
+    Args:
+        url (str): FBref match URL
+
+    Returns:
+        tuple of (team_ids (list), tables (list)): Team IDs and a Selector for
+        each stats table
+    """
+    res = _SESSION.get(url, timeout=15)
+    # Raise on error pages (e.g. 429 when rate limited) so they are not memoized
+    res.raise_for_status()
+
+    team_ids = []
+    tables = []
+    for _, el in etree.iterparse(
+        io.BytesIO(res.content), tag=("div", "table"), html=True
+    ):
+        if el.tag == "div" and el.get("itemprop") == "performer":
+            # Detached copy so the shared query only sees this div
+            team_ids += Selector(root=copy.deepcopy(el)).xpath(_TEAMS_XP).re(
+                _SQUAD_RE
+            )
+        elif el.tag == "table" and "stats" in el.get("id", ""):
+            tables.append(Selector(root=copy.deepcopy(el)))
+
+        # Free the parsed element and everything before it, unless the links
+        # of an unfinished team div are still needed
+        if not _inside_performer(el):
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+    return team_ids, tables
+
+
+def fetch_pages(urls: list) -> list:
+    """Downloads and parses FBref match pages concurrently.
 
     Args:
         urls (list): List of FBref match URLs
 
+    Returns:
+        list: List of (team_ids, tables) tuples, one per unique URL
+    """
+    urls = unique_urls(urls)
+    # FBref rate limits and temporarily bans aggressive clients, so keep this
+    # small. See DOWNLOAD_DELAY and AUTOTHROTTLE_* in settings.py for the
+    # spider's politeness settings.
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as ex:
+        return list(ex.map(_fetch_page, urls))
+
+
+def get_table_types(pages: list) -> dict:
+    """Gets a list of tables with their types from FBref page.
+
+    Args:
+        pages (list): List of (team_ids, tables) tuples from fetch_pages()
+
     Returns:
         dict: {Table Selector: Type}
         None: if no tables found
     """
     table_types = {} # Empty dict to collect tables from all URLs
-    for url in urls:
-        res = requests.get(url)
-        response = TextResponse(res.url, body=res.text, encoding="utf-8")
-        
-        ids = response.xpath('//div[@itemprop="performer"]//a/@href').re(
-            "(?<=\/squads\/)[a-zA-Z0-9]+"
-        )
-        all_tables = response.xpath('//table[contains(@id, "stats")]')
-
+    for ids, all_tables in pages:
         if not all_tables:
             return None  # No tables found
 
@@ -71,24 +189,23 @@ def get_table_types(urls: list) -> dict:
     return table_types
 
 
-def get_all_variables(urls: list) -> dict:
-    """From a list of FBref match URLs, Returns all table categories and a list
-    of variables present in each.
+def get_all_variables(tables: dict) -> dict:
+    """From the tables found on FBref match pages, Returns all table categories
+    and a list of variables present in each.
 
     Args:
-        urls (list): List of FBref match URLs
+        tables (dict): {Table Selector: Type} as returned by get_table_types()
 
     Returns:
         dict: {table categories : variables}
     """
 
     all_vars = {}  # Empty dict to store variable lists
-    tables = get_table_types(urls)
     if not tables:
         raise Exception("No valid stats tables found.")
 
     for table, cat in tables.items():
-        variables = table.xpath("./thead/tr[last()]/th/@data-stat").getall()
+        variables = table.xpath(_VARS_XP).getall()
         for v in variables:
             try:
                 if v not in all_vars[cat]:
@@ -99,7 +216,22 @@ def get_all_variables(urls: list) -> dict:
     return all_vars
 
 
-def remove_duplicate_values(variables:dict, ranks: dict) -> dict:
+def priority_order(ranks: dict) -> list:
+    """Orders categories from lowest to highest priority.
+
+    Args:
+        ranks (dict): {category: rank} where ranks are numeric. Lower numeric
+                    ranks have higher priority.
+
+    Returns:
+        list: Category labels in order low priority -> high priority
+    """
+    return [k for k, _ in sorted(ranks.items(), key=lambda kv: kv[1], reverse=True)]
+
+
+def remove_duplicate_values(
+    variables: dict, ranks: dict, priorities: list = None
+) -> dict:
     """Removes duplicated values from input dictionary according to the priority
     order provided.
 
@@ -107,22 +239,19 @@ def remove_duplicate_values(variables:dict, ranks: dict) -> dict:
         variables (dict): {category: values} where values are repeated across categories
         ranks (dict): {category: rank} where ranks are numeric. Duplicate values
                     are assigned to the key with lowest numeric rank.
+        priorities (list, optional): Precomputed priority_order(ranks). Sorted
+                    from ranks if not provided. Defaults to None.
 
     Returns:
-        dict: Input dict with duplicate values removed.
+        dict: {category: values} with duplicate values removed. Values are
+            held as dict keys, an ordered set in page column order.
     """
-    priorities = copy.deepcopy(ranks)
-    categories = list(priorities.keys())
-
-    # Create priority ordered list of categories
-    priorities = sorted(
-        priorities.items(),
-        key=lambda x: x[1],
-        reverse=True,
-    )
-    # Keep only labels
-    priorities = [x[0] for x in priorities]
-    
+    categories = list(ranks.keys())
+
+    # Create priority ordered list of category labels
+    if priorities is None:
+        priorities = priority_order(ranks)
+
     if not set(variables.keys()).issubset(priorities):
         raise Exception(
             'Exception: {} have no assigned ranks. Update settings.yml'.format(
@@ -133,65 +262,49 @@ def remove_duplicate_values(variables:dict, ranks: dict) -> dict:
     # Join all lists into single list
     all_vars = [item for vars in list(variables.values()) for item in vars]
 
-    # Filter unique stats
-    unique_vars = set(all_vars)
+    # Count how many tables each stat appears in
+    var_counts = Counter(all_vars)
+    summary_threshold = len(categories) * 0.7
 
     # For each unique stat, find which tables it appears in
-    var_categories = {}
-    for var in unique_vars:
-        cat_list = []
-        for cat in categories:
-            if var in variables[cat]:
-                cat_list.append(cat)
-        var_categories[var] = cat_list
+    var_categories = defaultdict(list)
+    for cat, vars in variables.items():
+        for var in vars:
+            var_categories[var].append(cat)
 
     var_map = {}  # Create empty dict
     for var, cats in var_categories.items():
 
         # If present in >70% of tables, assign to summary
-        if (
-            all_vars.count(var) > len(categories) * 0.7
-            and "summary" in var_categories[var]
-        ):
+        if var_counts[var] > summary_threshold and "summary" in cats:
             var_map[var] = "summary"
 
         # Otherwise, begin removing lower priority categories until one remains
         else:
             var_map[var] = select_top_priority(cats, priorities)
 
-    output = {}  # Create final table mapping
+    # Create final table mapping, keeping the page's column order
+    output = defaultdict(dict)
     for cat, vars in variables.items():
         for v in vars:
             if var_map[v] == cat:
-                try:
-                    output[cat].append(v)
-                except KeyError:
-                    output[cat] = [v]
+                output[cat][v] = None
     # Return final dict
-    return output
+    return dict(output)
 
 
 def find_difference(left: dict, right: dict) -> dict:
-    """Accepts two dicts with list values. Check which items are present in left
-    but not in right, similar to set difference.
+    """Accepts two dicts with ordered set values (dicts keyed by value). Check
+    which items are present in left but not in right, similar to set
+    difference.
 
     Args:
-        left (dict): Dict with list values
-        right (dict): Dict with list values
+        left (dict): Dict with ordered set values
+        right (dict): Dict with ordered set values
 
     Returns:
-        dict: Dict with list values. Contains items in left but not in right
+        dict: Dict with set values. Contains items in left but not in right
     """
-    diff = {} # Empty dict to store differences
-    for key, values in left.items():
-        if key in right.keys():
-            right_values = [v for v in right[key]]
-            diff[key] = set(values).difference(
-                set(right_values)
-            )
-        else:
-            # If key doesn't exist in right, all values are new
-            diff[key] = left[key]
-    
-    diff = {k:v for k,v in diff.items() if len(v) > 0} # Remove empty
-    return diff
\ No newline at end of file
+    diff = {k: v.keys() - right.get(k, {}) for k, v in left.items()}
+    diff = {k: v for k, v in diff.items() if v}  # Remove empty
+    return diff
@@ -3,11 +3,33 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+import re
+
 import scrapy
 from scrapy import Field, Selector
 import pandas as pd
 from itemloaders.processors import Compose
 
+# Queries reused by the spider and table extraction
+TEAMS_XPATH = '//div[@itemprop="performer"]//a/@href'
+VARS_XPATH = "./thead/tr[last()]/th/@data-stat"
+SQUAD_ID_RE = re.compile(r"(?<=\/squads\/)[a-zA-Z0-9]+")
+PLAYER_ID_RE = re.compile(r"(?<=\/players\/)[a-zA-Z0-9]+")
+
+
+def _hrefs(cell) -> list:
+    """Returns all link targets within a table cell element"""
+    if cell is None:
+        return []
+    return [a.get("href") for a in cell.iter("a") if a.get("href")]
+
+
+def _first_href(cell):
+    """Returns the first link target within a table cell element, if any"""
+    hrefs = _hrefs(cell)
+    return hrefs[0] if hrefs else None
+
+
 def extract_table(table: scrapy.Selector) -> pd.DataFrame:
     """Extracts an FBRef table from the provided selector, along with any player
     IDs found. Should work on advanced stats or shots tables.
@@ -19,30 +41,44 @@ def extract_table(table: scrapy.Selector) -> pd.DataFrame:
         pd.DataFrame: Table converted to dataframe. Not cleaned.
     """
     # Get list of columns
-    vars = table.xpath("./thead/tr[last()]/th/@data-stat").getall()
+    vars = table.xpath(VARS_XPATH).getall()
+
+    # Get every stat cell in the table with a single query, then group them
+    # by row and stat
+    # * Needs to be grouped by row to account for occasional missing values
+    rows = table.root.xpath("./tbody/tr")
+    row_cells = {row: {} for row in rows}
+    for cell in table.root.xpath("./tbody/tr/*[@data-stat]"):
+        row_cells[cell.getparent()].setdefault(cell.get("data-stat"), cell)
+
+    # Columns are known upfront, so fill preallocated lists column by column
+    n = len(rows)
+    data = {"player_id": [None] * n}
+    for var in vars:
+        data[var] = [None] * n
+        if "player" in var:
+            data[var + "_id"] = [None] * n
 
-    # Iterate through each row of the table, getting each stat
-    # * Needs to be done row by row to account for occasional missing values
-    data = []  # Empty list to store data
-    for row in table.xpath("./tbody/tr"):
-        row_data = {}
+    for i, row in enumerate(rows):
+        cells = row_cells[row]
         # Get player ID
-        row_data["player_id"] = row.xpath('./*[@data-stat = "player"]//@href').get()
+        data["player_id"][i] = _first_href(cells.get("player"))
 
         for var in vars:
-            text = row.xpath("./*[@data-stat = $var]//text()", var=var).getall()
+            cell = cells.get(var)
+            text = list(cell.itertext()) if cell is not None else []
             # Some cols contain additional strings prefixed
             # Player - whitespace for subs, nationality - two letter code
-            row_data[var] = text[-1].strip()  # Keep second item
+            data[var][i] = text[-1].strip() if text else None  # Keep last item
             # For any "player" stat, we also need to get the ID
             if "player" in var:
-                id_col = var + "_id"
-                row_data[id_col] = row.xpath(
-                    "./*[@data-stat = $var]//@href", var=var
-                ).re('(?<=\/players\/)[a-zA-Z0-9]+')
-        data.append(row_data)
-    # Combine rows into pandas DataFrame
-    return pd.DataFrame(data)
+                data[var + "_id"][i] = [
+                    player_id
+                    for href in _hrefs(cell)
+                    for player_id in PLAYER_ID_RE.findall(href)
+                ]
+    # Combine columns into pandas DataFrame
+    return pd.DataFrame(data, copy=False)
 
 
 class MatchDetailsItem(scrapy.Item):
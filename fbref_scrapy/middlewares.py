@@ -3,19 +3,42 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from time import time
+
 from scrapy import signals
-from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.extensions.httpcache import RFC2616Policy, rfc1123_to_epoch
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
 
 
-class CachePolicy(DummyPolicy):
-    """Cache only requests with 200 response status
+class CachePolicy(RFC2616Policy):
+    """Cache only requests with 200 response status.
+
+    Pages with ETag/Last-Modified validators follow RFC2616 and are revalidated
+    with conditional requests once stale. Pages without validators cannot be
+    revalidated, so they are served from the cache for
+    HTTPCACHE_FALLBACK_FRESH_SECS, as with the DummyPolicy.
     """
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.fallback_fresh_secs = settings.getint(
+            'HTTPCACHE_FALLBACK_FRESH_SECS', 86400
+        )
+
     def should_cache_response(self, response, request):
         return response.status == 200
 
+    def is_cached_response_fresh(self, cachedresponse, request):
+        headers = cachedresponse.headers
+        if b'ETag' in headers or b'Last-Modified' in headers:
+            return super().is_cached_response_fresh(cachedresponse, request)
+
+        date = rfc1123_to_epoch(headers.get(b'Date'))
+        if date is None:
+            return False  # Age unknown, download again
+        return time() - date < self.fallback_fresh_secs
+
 
 
 class FbrefScrapySpiderMiddleware:
@@ -82,12 +82,17 @@ AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+# Disable for production runs with: scrapy crawl <spider> -s HTTPCACHE_ENABLED=False
 HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 86400 # 24 hours
+HTTPCACHE_EXPIRATION_SECS = 0 # Keep entries, freshness is decided by the policy
 HTTPCACHE_POLICY = 'fbref_scrapy.middlewares.CachePolicy' # in middlewares.py
-HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_FALLBACK_FRESH_SECS = 86400 # 24 hours, pages without ETag/Last-Modified
+# Compressed entries can't be read from the old uncompressed 'httpcache' dir,
+# which can be deleted
+HTTPCACHE_DIR = 'httpcache_gz'
+HTTPCACHE_GZIP = True
 # HTTPCACHE_IGNORE_HTTP_CODES = [] # Cache policy allows only 200
-# HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.DbmCacheStorage'
+HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
 
 # Enable Compression
 COMPRESSION_ENABLED = True
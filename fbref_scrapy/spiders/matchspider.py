@@ -1,9 +1,18 @@
+import re
+
 import scrapy
 from scrapy.loader import ItemLoader
-from fbref_scrapy.items import MatchDetailsItem
+from fbref_scrapy.items import MatchDetailsItem, SQUAD_ID_RE, TEAMS_XPATH
+
+OFFICIAL_RE = re.compile(r'([\w\s]+)\((\w+)\)')
 
 class MatchSpider(scrapy.Spider):
     name = 'fbref_match'
+
+    # Cache pages during development, -s HTTPCACHE_ENABLED=False still overrides
+    custom_settings = {
+        'HTTPCACHE_ENABLED': True,
+    }
     
     # TODO Replace with start_requests() method after initial tests
     # TODO Need additional test URLs (available/not on Wayback Machine) for middleware test
@@ -15,16 +24,13 @@ class MatchSpider(scrapy.Spider):
         loader = ItemLoader(item= MatchDetailsItem(), response= response)
         
         # Team IDs
-        team_ids = (
-            response.xpath('//div[@itemprop="performer"]//a/@href')
-                    .re('(?<=\/squads\/)[a-zA-Z0-9]+')
-        )
+        team_ids = response.xpath(TEAMS_XPATH).re(SQUAD_ID_RE)
         loader.add_value('team_ids', team_ids)
         
         # Officials
         officials = {} # empty dict
         for item in response.xpath('//div[@class = "scorebox_meta"]/div[contains(./strong//text(), "Officials")]//span'):
-            text = item.xpath('.//text()').re('([\w\s]+)\((\w+)\)')
+            text = item.xpath('.//text()').re(OFFICIAL_RE)
             offtype = 'official_' + text[1].lower()
             offname = text[0]
             officials[offtype] = offname